@@ -0,0 +1,262 @@
+from typing import List, Optional, Type, TypeVar
+from pydantic import BaseModel, ConfigDict, ValidationError
+from app.data_types import DataProfileState, SheetState
+from app.llm_client import create_chat_completion
+from app.InsightAgent import generate_insights
+from app.PlotSuggestionAgent import suggest_plots
+from app import batching
+from app.batching import group_by_batch
+
+
+class InsightItem(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    insight: str
+    takeaway: str
+
+
+class ChartItem(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    plot: str
+    description: str
+
+
+class SheetAnalysis(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    insights: List[InsightItem]
+    charts: List[ChartItem]
+
+
+class NamedSheetAnalysis(BaseModel):
+    # sheet_name comes first so the model states which sheet it is writing about before the content
+    model_config = ConfigDict(extra="forbid")
+    sheet_name: str
+    insights: List[InsightItem]
+    charts: List[ChartItem]
+
+
+class BatchAnalysis(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    sheets: List[NamedSheetAnalysis]
+
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "sheet_analysis",
+        "strict": True,
+        "schema": SheetAnalysis.model_json_schema(),
+    },
+}
+
+
+def batch_response_format(sheet_names: List[str]) -> dict:
+    # Pin sheet_name to this batch's names so results always map back to a sheet
+    schema = BatchAnalysis.model_json_schema()
+    schema["$defs"]["NamedSheetAnalysis"]["properties"]["sheet_name"]["enum"] = sheet_names
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "batch_analysis",
+            "strict": True,
+            "schema": schema,
+        },
+    }
+
+
+def build_system_prompt(df_columns: List[str]) -> dict:
+    return {
+        "role": "system",
+        "content": f"""
+            You are a business insights and data visualization agent. Your role is to generate clear, actionable, and relevant textual insights based on structured data, together with charts that visualize them.
+
+            You have been provided with two key inputs:
+
+            A basic summary of an Excel file, including row/column counts, data types, missing values, unique values, and sample entries.
+            A data profile description, which includes detailed statistical and structural metadata about the Excel file.
+
+            Your task is to analyze this information and generate at most 9 applicable business insights that can be inferred from the data,
+            and at most 9 chart or plot suggestions that help visualize those insights.
+
+            Each insight has:
+            - "insight": grounded in the data, clearly stated and context-aware
+            - "takeaway": framed as a meaningful takeaway for a business decision-maker
+
+            Each chart has:
+            - "plot": valid Python matplotlib code as a string that can be executed to generate the chart
+            - "description": a short explanation of what the chart reveals and why it's useful
+
+            Chart requirements:
+            - Each chart must be based on a specific insight.
+            - Use diverse chart types (e.g., bar, line, pie, scatter, histogram, box plot, heatmap, etc.).
+            - Use the following DataFrame: The name of the dataframe is "df"
+            - Use only the column names of the DataFrame: {df_columns}
+            - Do not invent or assume any other columns.
+            - Do not include placeholder data — assume the data is already loaded in df.
+            - Always assign the figure to a variable using fig = plt.figure() and plot on that figure. Do not rely on implicit figure creation.
+
+            Avoid generic statements. Focus on clarity, relevance, and impact.
+            """
+    }
+
+
+def build_batch_system_prompt(sheets: List[SheetState]) -> dict:
+    columns_by_sheet = "\n".join(
+        f"            - {sheet['sheet_name']}: {list(sheet['df'].columns)}" for sheet in sheets
+    )
+    return {
+        "role": "system",
+        "content": f"""
+            You are a business insights and data visualization agent. You will receive several small sheets from the same workbook.
+            Analyze every sheet independently and return one entry per sheet, with "sheet_name" set exactly to the sheet's name.
+
+            For each sheet you have a basic summary (row/column counts, data types, missing values, unique values, sample entries)
+            and a statistical profile.
+
+            For each sheet generate at most {batching.BATCH_MAX_INSIGHTS} applicable business insights and at most {batching.BATCH_MAX_CHARTS} chart or plot suggestions that visualize them.
+
+            Each insight has:
+            - "insight": grounded in the data, clearly stated and context-aware
+            - "takeaway": framed as a meaningful takeaway for a business decision-maker
+
+            Each chart has:
+            - "plot": valid Python matplotlib code as a string that can be executed to generate the chart
+            - "description": a short explanation of what the chart reveals and why it's useful
+
+            Chart requirements:
+            - Each chart must be based on a specific insight of the same sheet.
+            - The chart code only sees that sheet's data, as a DataFrame named "df"
+            - Use only that sheet's column names:
+{columns_by_sheet}
+            - Do not invent or assume any other columns.
+            - Do not include placeholder data — assume the data is already loaded in df.
+            - Always assign the figure to a variable using fig = plt.figure() and plot on that figure. Do not rely on implicit figure creation.
+
+            Avoid generic statements. Focus on clarity, relevance, and impact.
+            """
+    }
+
+
+def apply_analysis(sheet: SheetState, analysis: SheetAnalysis) -> SheetState:
+    blocks = []
+    lines = []
+    for i, item in enumerate(analysis.insights, start=1):
+        blocks.append({
+            "num": str(i),
+            "title": f"Insight {i}",
+            "insight": item.insight,
+            "takeaway": item.takeaway,
+        })
+        lines.append(f"Insight {i}:\nInsight: {item.insight}\nTakeaway: {item.takeaway}")
+
+    sheet['insight_blocks'] = blocks
+    # Keep the plain-text form as well so anything reading 'insights' still works
+    sheet['insights'] = "\n---\n".join(lines)
+    sheet['visuals'] = {
+        f"chart{i}": {"plot": chart.plot, "description": chart.description}
+        for i, chart in enumerate(analysis.charts, start=1)
+    }
+    return sheet
+
+
+def parse_structured(response, model: Type[Model], label: str) -> Optional[Model]:
+    # Returns None when the model refused, was cut off or broke the schema
+    choice = response.choices[0]
+    if getattr(choice.message, "refusal", None):
+        print(f"[ERROR] Model refused structured response for {label}: {choice.message.refusal}")
+        return None
+    if choice.finish_reason == "length":
+        print(f"[ERROR] Structured response for {label} was truncated at max_tokens")
+        return None
+    try:
+        return model.model_validate_json(choice.message.content or "")
+    except ValidationError as e:
+        print(f"[ERROR] Invalid structured response for {label}: {e}")
+        return None
+
+
+def analyze_sheet_two_step(sheet: SheetState) -> SheetState:
+    # Fallback to the separate insights and plot suggestion calls
+    state: DataProfileState = {"filepath": "", "sheets": [sheet]}
+    state = suggest_plots(generate_insights(state))
+    return state["sheets"][0]
+
+
+def analyze_sheet(sheet: SheetState) -> SheetState:
+    sheet_name = sheet["sheet_name"]
+    summary = sheet["summary"]
+    profile = sheet["profile"]
+    df_columns = list(sheet["df"].columns)
+
+    user_prompt = {
+        "role": "user",
+        "content": f"Sheet:{sheet_name}\n Summary:{summary}\n Profile:{profile}"
+    }
+
+    response = create_chat_completion(
+        messages=[build_system_prompt(df_columns), user_prompt],
+        max_tokens=8192,
+        temperature=0,
+        top_p=1.0,
+        model="gpt-4o",
+        response_format=RESPONSE_FORMAT,
+    )
+    analysis = parse_structured(response, SheetAnalysis, sheet_name)
+    if analysis is None:
+        print(f"[WARNING] Falling back to two-step insights for {sheet_name}")
+        return analyze_sheet_two_step(sheet)
+
+    return apply_analysis(sheet, analysis)
+
+
+def analyze_batch(sheets: List[SheetState]) -> List[SheetState]:
+    # One packed prompt for several small sheets, fanned back out by sheet name
+    sheet_names = [str(sheet["sheet_name"]) for sheet in sheets]
+    user_prompt = {
+        "role": "user",
+        "content": "\n---\n".join(
+            f"Sheet:{sheet['sheet_name']}\n Summary:{sheet['summary']}\n Profile:{sheet['profile']}"
+            for sheet in sheets
+        )
+    }
+
+    response = create_chat_completion(
+        messages=[build_batch_system_prompt(sheets), user_prompt],
+        max_tokens=batching.BATCH_MAX_TOKENS,
+        temperature=0,
+        top_p=1.0,
+        model="gpt-4o",
+        response_format=batch_response_format(sheet_names),
+    )
+
+    batch = parse_structured(response, BatchAnalysis, f"batch {sheet_names}")
+    results = {}
+    if batch is not None:
+        for item in batch.sheets:
+            results.setdefault(item.sheet_name, item)
+
+    updated_sheets: List[SheetState] = []
+    for sheet, name in zip(sheets, sheet_names):
+        analysis = results.get(name)
+        if analysis is None:
+            print(f"[WARNING] No batched analysis returned for {name}, analysing it on its own")
+            updated_sheets.append(analyze_sheet(sheet))
+        else:
+            updated_sheets.append(apply_analysis(sheet, analysis))
+    return updated_sheets
+
+
+def generate_insights_and_plots(state: DataProfileState) -> DataProfileState:
+
+    updated_sheets: List[SheetState] = []
+    for group in group_by_batch(state["sheets"]):
+        if len(group) > 1:
+            updated_sheets.extend(analyze_batch(group))
+        else:
+            updated_sheets.append(analyze_sheet(group[0]))
+
+    state["sheets"] = updated_sheets
+    print("CombinedInsightAgent is done")
+    return state
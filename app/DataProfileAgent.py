@@ -1,7 +1,8 @@
 from typing import List
 import pandas as pd
-from app.profiler import parse_excel, basic_summary, profile_to_json
+from app.profiler import parse_excel, basic_summary, profile_to_json, light_profile_to_json
 from app.data_types import DataProfileState, SheetState
+from app import batching
 import secrets
 
 def get_data_profile(state: DataProfileState) -> DataProfileState:
@@ -13,16 +14,30 @@ def get_data_profile(state: DataProfileState) -> DataProfileState:
     else:
         sheets = parse_excel(filepath)
     
+    small_sheets = {}
+    if batching.BATCH_SMALL_SHEETS:
+        small_sheets = {name: df for name, df in sheets.items() if batching.is_small_sheet(df)}
+    # A lone small sheet gains nothing from batching
+    if len(small_sheets) < 2:
+        small_sheets = {}
+    batch_of = batching.assign_batches(list(small_sheets))
+
     sheet_states: List[SheetState] = []
     for sheet_name, df in sheets.items():
         summary = basic_summary(df)
-        profile  = profile_to_json(df)
-        sheet_states.append({
+        if sheet_name in batch_of and batching.LIGHT_PROFILE_SMALL_SHEETS:
+            profile = light_profile_to_json(df)
+        else:
+            profile  = profile_to_json(df)
+        sheet_state: SheetState = {
             "sheet_name": sheet_name,
             "summary": summary,
             "profile": profile,
             "df": df
-        })
+        }
+        if sheet_name in batch_of:
+            sheet_state["batch_id"] = batch_of[sheet_name]
+        sheet_states.append(sheet_state)
     state['sheets'] = sheet_states
     print("DataProfileAgent is done")
     return state
\ No newline at end of file
@@ -1,6 +1,6 @@
 from typing import List
 from app.data_types import DataProfileState, SheetState
-from app.llm_client import client
+from app.llm_client import create_chat_completion
 
 def generate_insights(state: DataProfileState) -> DataProfileState:
 
@@ -51,7 +51,7 @@ def generate_insights(state: DataProfileState) -> DataProfileState:
             "content": f"Sheet:{sheet_name}\n Summary:{summary}\n Profile:{profile}"
         }
 
-        response = client.chat.completions.create(
+        response = create_chat_completion(
             messages=[system_prompt, user_prompt],
             max_tokens=4096,
             temperature=1.0,
@@ -1,6 +1,6 @@
 from typing import List
 from app.data_types import DataProfileState, SheetState
-from app.llm_client import client
+from app.llm_client import create_chat_completion
 import ast
 
 def suggest_plots(state: DataProfileState) -> DataProfileState:
@@ -47,7 +47,7 @@ def suggest_plots(state: DataProfileState) -> DataProfileState:
                     - Always assign the figure to a variable using fig = plt.figure() and plot on that figure. Do not rely on implicit figure creation.
                     """
                         }
-        response = client.chat.completions.create(
+        response = create_chat_completion(
             messages=[system_prompt, user_prompt],
             max_tokens=4096,
             temperature=0,
@@ -0,0 +1,53 @@
+import math
+import os
+import secrets
+from typing import List, Dict, Any
+import pandas as pd
+from app.data_types import SheetState
+
+# Small sheets are analysed with packed LLM prompts and reported in a shared PDF instead of one by one
+BATCH_SMALL_SHEETS = os.getenv("BATCH_SMALL_SHEETS", "false").lower() in ("1", "true", "yes")
+SMALL_SHEET_MAX_ROWS = int(os.getenv("SMALL_SHEET_MAX_ROWS", "500"))
+SMALL_SHEET_MAX_COLS = int(os.getenv("SMALL_SHEET_MAX_COLS", "20"))
+SHEETS_PER_BATCH = int(os.getenv("SHEETS_PER_BATCH", "8"))
+if SHEETS_PER_BATCH <= 0:
+    raise ValueError(f"SHEETS_PER_BATCH must be positive, got {SHEETS_PER_BATCH}")
+# A packed prompt shares one response between all its sheets, so each sheet gets fewer items than the 9 of a lone sheet
+BATCH_MAX_INSIGHTS = int(os.getenv("BATCH_MAX_INSIGHTS", "3"))
+BATCH_MAX_CHARTS = int(os.getenv("BATCH_MAX_CHARTS", "3"))
+BATCH_MAX_TOKENS = int(os.getenv("BATCH_MAX_TOKENS", "16384"))
+# Small sheets get a pandas-only profile instead of a ydata report; this drops ydata's correlations beyond
+# Pearson, alerts and other report content in exchange for skipping the per-sheet ydata overhead
+LIGHT_PROFILE_SMALL_SHEETS = os.getenv("LIGHT_PROFILE_SMALL_SHEETS", "true").lower() in ("1", "true", "yes")
+
+
+def is_small_sheet(df: pd.DataFrame) -> bool:
+    return df.shape[0] <= SMALL_SHEET_MAX_ROWS and df.shape[1] <= SMALL_SHEET_MAX_COLS
+
+
+def assign_batches(sheet_names: List[str]) -> Dict[str, str]:
+    # Maps each sheet name to the id of the batch it belongs to. Sheets are spread evenly
+    # over the fewest batches that respect SHEETS_PER_BATCH, so 9 sheets become 5 + 4 rather
+    # than 8 + 1. A batch that still ends up with one sheet is left out, as it gains nothing
+    batch_of: Dict[str, str] = {}
+    n_batches = math.ceil(len(sheet_names) / SHEETS_PER_BATCH)
+    start = 0
+    for i in range(n_batches):
+        size = len(sheet_names) // n_batches + (1 if i < len(sheet_names) % n_batches else 0)
+        names = sheet_names[start:start + size]
+        start += size
+        if len(names) < 2:
+            continue
+        batch_id = secrets.token_hex(8)
+        for name in names:
+            batch_of[name] = batch_id
+    return batch_of
+
+
+def group_by_batch(sheets: List[SheetState]) -> List[List[SheetState]]:
+    # Batched sheets are grouped together, every other sheet stays on its own
+    groups: Dict[Any, List[SheetState]] = {}
+    for idx, sheet in enumerate(sheets):
+        key = sheet.get("batch_id") or idx
+        groups.setdefault(key, []).append(sheet)
+    return list(groups.values())
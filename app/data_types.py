@@ -7,11 +7,14 @@ class SheetState(TypedDict):
     profile: Dict[str, Any]
     df: pd.DataFrame
     insights: str
+    insight_blocks: List[Dict[str, str]]
     visuals: Dict[str, Dict[str, Any]]
     pdf_path: str
+    batch_id: str
     images_with_descriptions: List[Tuple[str, str]]
 
 
 class DataProfileState(TypedDict):
     filepath: str
+    run_id: str
     sheets: List[SheetState]
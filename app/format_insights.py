@@ -1,5 +1,5 @@
 from reportlab.platypus import Paragraph, Spacer, ListItem, ListFlowable
-from typing import List, Dict
+from typing import List, Dict, Optional
 import re
 from reportlab.lib.styles import ParagraphStyle
 
@@ -52,15 +52,16 @@ def parse_insights_blocks(raw: str) -> List[Dict[str, str]]:
     return results
 
 
-def format_insights_flowables(insights_raw: str, styles) -> List:
+def format_insights_flowables(insights_raw: str, styles, blocks: Optional[List[Dict[str, str]]] = None) -> List:
     """
     Convert parsed insights into ReportLab flowables:
     - Heading: "N: Title" (bold)
     - Bullets: "Insight: ..." and "Takeaway: ..." (bold labels)
+    If already-structured blocks are given, they are used instead of parsing insights_raw.
     Returns a list of flowables for insertion into a Frame.
     """
     flowables = []
-    parsed = parse_insights_blocks(insights_raw)
+    parsed = blocks if blocks is not None else parse_insights_blocks(insights_raw)
 
     # Styles
     heading_style = ParagraphStyle(
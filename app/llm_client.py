@@ -1,5 +1,6 @@
 from openai import AzureOpenAI
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,6 +12,9 @@ endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
 subscription_key = os.getenv("AZURE_OPENAI_API_KEY")
 deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")
 api_version = "2024-12-01-preview"
+# Shared by every workflow run, so concurrent uploads cannot exceed this many in-flight requests
+LLM_CONCURRENCY = int(os.getenv("SCHEDULER_LLM_CONCURRENCY", "4"))
+llm_slots = threading.BoundedSemaphore(LLM_CONCURRENCY)
 
 try:
     client = AzureOpenAI(
@@ -23,4 +27,9 @@ except Exception as e:
     client = None
 
 
+def create_chat_completion(**kwargs):
+    with llm_slots:
+        return client.chat.completions.create(**kwargs)
+
+
 
@@ -1,16 +1,21 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Request
 from fastapi.responses import JSONResponse, FileResponse, HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 import shutil
+import asyncio
+import secrets
 from typing import List
 from langgraph.graph import StateGraph, START, END
 from app.DataProfileAgent import get_data_profile
 from app.InsightAgent import generate_insights
 from app.PlotSuggestionAgent import suggest_plots
+from app.CombinedInsightAgent import generate_insights_and_plots
 from app.PDFAgent import make_pdf_report
 from app.data_types import DataProfileState
+from app import batching
+from app.scheduler import scheduler, SchedulerSaturated, MAX_UPLOAD_MB
 
 # Define base paths
 BASE_DIR = os.path.dirname(__file__)
@@ -20,6 +25,9 @@ STATIC_DIR = os.path.join(BASE_DIR, "static")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(REPORT_DIR, exist_ok=True)
 
+# One structured LLM call per sheet (insights + charts) instead of two serial calls
+COMBINED_LLM_CALL = os.getenv("COMBINED_LLM_CALL", "false").lower() in ("1", "true", "yes")
+
 app = FastAPI()
 
 # Enable CORS for frontend access
@@ -31,6 +39,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def busy_response(retry_after: int) -> JSONResponse:
+    return JSONResponse(
+        content={"success": False, "error": "Server is busy, please retry later"},
+        status_code=429,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+# Reject oversized or unadmittable uploads from the headers, before the body is read
+@app.middleware("http")
+async def upload_precheck(request: Request, call_next):
+    if request.method == "POST" and request.url.path == "/upload":
+        content_length = request.headers.get("content-length", "")
+        # Without a length the body could only be size-checked after Starlette has stored it
+        if not content_length.isdigit():
+            return JSONResponse(content={"error": "Content-Length is required"}, status_code=411)
+        if int(content_length) > MAX_UPLOAD_MB * 1024 * 1024:
+            return JSONResponse(content={"error": f"File is larger than {MAX_UPLOAD_MB:g} MB"}, status_code=413)
+        try:
+            scheduler.check_saturated(int(content_length))
+        except SchedulerSaturated as e:
+            return busy_response(e.retry_after)
+    return await call_next(request)
+
 # Serve static frontend
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
@@ -45,14 +77,21 @@ async def serve_index():
 # LangGraph workflow
 graph = StateGraph(DataProfileState)
 graph.add_node('get_data_profile', get_data_profile)
-graph.add_node('get_textual_insights', generate_insights)
-graph.add_node('get_visualization_code', suggest_plots)
 graph.add_node('get_pdf_report', make_pdf_report)
-
 graph.add_edge(START, 'get_data_profile')
-graph.add_edge('get_data_profile', 'get_textual_insights')
-graph.add_edge('get_textual_insights', 'get_visualization_code')
-graph.add_edge('get_visualization_code', 'get_pdf_report')
+
+# Packed prompts for batched small sheets need the structured combined call
+if COMBINED_LLM_CALL or batching.BATCH_SMALL_SHEETS:
+    graph.add_node('get_insights_and_visuals', generate_insights_and_plots)
+    graph.add_edge('get_data_profile', 'get_insights_and_visuals')
+    graph.add_edge('get_insights_and_visuals', 'get_pdf_report')
+else:
+    graph.add_node('get_textual_insights', generate_insights)
+    graph.add_node('get_visualization_code', suggest_plots)
+    graph.add_edge('get_data_profile', 'get_textual_insights')
+    graph.add_edge('get_textual_insights', 'get_visualization_code')
+    graph.add_edge('get_visualization_code', 'get_pdf_report')
+
 graph.add_edge('get_pdf_report', END)
 
 workflow = graph.compile()
@@ -63,24 +102,42 @@ async def upload_file(file: UploadFile = File(...)):
     if not file.filename.endswith((".csv", ".xlsx", ".xls")):
         return JSONResponse(content={"error": "Invalid file type"}, status_code=400)
 
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
+    # Runs are concurrent, so every request gets its own upload path and report prefix
+    run_id = secrets.token_hex(8)
+    file_path = os.path.join(UPLOAD_DIR, f"{run_id}_{os.path.basename(file.filename)}")
+    if file.size is not None and file.size > MAX_UPLOAD_MB * 1024 * 1024:
+        return JSONResponse(content={"error": f"File is larger than {MAX_UPLOAD_MB:g} MB"}, status_code=413)
+    try:
+        scheduler.check_saturated(file.size or 0)
+    except SchedulerSaturated as e:
+        return busy_response(e.retry_after)
+
     try:
         with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+            await asyncio.to_thread(shutil.copyfileobj, file.file, buffer)
     except Exception as e:
         return JSONResponse(content={"error": f"File upload failed: {e}"}, status_code=500)
 
     try:
-        initial_state = {"filepath": file_path}
-        final_state = workflow.invoke(initial_state)
+        cost = await scheduler.estimate(file_path)
+        # Waits for CPU and memory budget; short jobs are admitted first
+        async with scheduler.admit(cost):
+            initial_state = {"filepath": file_path, "run_id": run_id}
+            final_state = await asyncio.to_thread(workflow.invoke, initial_state)
+    except SchedulerSaturated as e:
+        return busy_response(e.retry_after)
     except Exception as e:
         return JSONResponse(content={"success": False, "error": f"Workflow failed: {e}"}, status_code=500)
+    finally:
+        # Uploads are per request, so nothing else will ever read this file again
+        if os.path.exists(file_path):
+            os.remove(file_path)
 
     pdfs: List[str] = []
     for sheet in final_state.get("sheets", []):
         pdf_name = sheet.get("pdf_path")
         pdf_path = os.path.join(REPORT_DIR, pdf_name) if pdf_name else None
-        if pdf_path and os.path.exists(pdf_path):
+        if pdf_path and os.path.exists(pdf_path) and pdf_name not in pdfs:
             pdfs.append(pdf_name)
 
     return JSONResponse(content={"success": True, "pdfs": pdfs})
@@ -28,4 +28,17 @@ def profile_to_json(df, sample_limit=10000):
     profile = ProfileReport(df_sample, minimal=True)
     return profile.get_description()
 
+def light_profile_to_json(df):
+    # Pandas-only stand-in for the ydata report: per-column describe, duplicates and Pearson correlations.
+    # No alerts, interactions or non-Pearson correlations, which is the price for skipping ydata
+    if df.shape[1] == 0:
+        return {}
+    stats = df.describe(include="all").astype(object)
+    corr = df.corr(numeric_only=True).round(3).astype(object)
+    return {
+        "variables": stats.where(stats.notna(), None).to_dict(),
+        "n_duplicates": int(df.duplicated().sum()),
+        "correlations": corr.where(corr.notna(), None).to_dict(),
+    }
+
 
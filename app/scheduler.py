@@ -0,0 +1,239 @@
+import asyncio
+import math
+import os
+import time
+import itertools
+import re
+import zipfile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import pandas as pd
+
+# Budgets for concurrently running workflow jobs
+CPU_SLOTS = int(os.getenv("SCHEDULER_CPU_SLOTS", str(os.cpu_count() or 2)))
+MEMORY_BUDGET_MB = float(os.getenv("SCHEDULER_MEMORY_BUDGET_MB", "4096"))
+MAX_QUEUED_JOBS = int(os.getenv("SCHEDULER_MAX_QUEUED_JOBS", "16"))
+# Cost probes run before admission, so they get their own small concurrency cap
+PROBE_SLOTS = int(os.getenv("SCHEDULER_PROBE_SLOTS", "2"))
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "2048"))
+# Seconds of waiting that cancel out one second of estimated run time, so big jobs are not starved
+AGING_RATE = float(os.getenv("SCHEDULER_AGING_RATE", "1.0"))
+
+# Rough cost model, tuned for ydata minimal profiles plus gpt-4o calls per sheet
+BASE_JOB_MB = 150.0
+BYTES_PER_CELL = 64
+SECONDS_PER_SHEET = 30.0
+SECONDS_PER_MILLION_CELLS = 20.0
+XLS_BYTES_PER_CELL = 16
+XLSX_XML_BYTES_PER_CELL = 40
+CSV_PROBE_BYTES = 1 << 20
+DIMENSION_PROBE_BYTES = 4096
+DIMENSION_PAT = re.compile(rb'<dimension ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"')
+
+
+class SchedulerSaturated(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Scheduler saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class JobCost:
+    file_size: int
+    n_sheets: int
+    n_cells: int
+    memory_mb: float
+    seconds: float
+    cpu: int = 1
+
+
+@dataclass
+class Job:
+    cost: JobCost
+    seq: int
+    submitted: float = field(default_factory=time.monotonic)
+    started: Optional[float] = None
+
+    def priority(self, now: float) -> float:
+        # Shortest job first, with waiting time slowly raising priority
+        return self.cost.seconds - AGING_RATE * (now - self.submitted)
+
+
+def probe_shape(filepath: str) -> List[tuple]:
+    # Quick (rows, cols) per sheet without loading the data
+    if filepath.endswith(".csv"):
+        with open(filepath, "rb") as f:
+            head = f.read(CSV_PROBE_BYTES)
+        n_lines = max(head.count(b"\n"), 1)
+        n_cols = len(pd.read_csv(filepath, nrows=5, encoding="utf-8").columns)
+        if len(head) < CSV_PROBE_BYTES:
+            return [(n_lines, n_cols)]
+        rows = int(os.path.getsize(filepath) / (len(head) / n_lines))
+        return [(rows, n_cols)]
+
+    if filepath.endswith(".xlsx"):
+        return probe_xlsx(filepath)
+
+    # Sheet names only; on_demand keeps xlrd from parsing any sheet
+    import xlrd
+    book = xlrd.open_workbook(filepath, on_demand=True)
+    try:
+        n_sheets = max(book.nsheets, 1)
+    finally:
+        book.release_resources()
+    # No cheap dimension lookup for .xls, so split the file size evenly across sheets
+    cells = os.path.getsize(filepath) // XLS_BYTES_PER_CELL // n_sheets
+    return [(cells, 1)] * n_sheets
+
+
+def column_number(letters: bytes) -> int:
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ch - ord("A") + 1)
+    return n
+
+
+def probe_xlsx(filepath: str) -> List[tuple]:
+    # Reads only the head of each sheet's XML for its <dimension> record,
+    # never the shared-strings table or the cell data
+    shapes = []
+    with zipfile.ZipFile(filepath) as zf:
+        for info in zf.infolist():
+            if not re.fullmatch(r"xl/worksheets/[^/]+\.xml", info.filename):
+                continue
+            with zf.open(info) as f:
+                m = DIMENSION_PAT.search(f.read(DIMENSION_PROBE_BYTES))
+            if m and m.group(3):
+                rows = int(m.group(4)) - int(m.group(2)) + 1
+                cols = column_number(m.group(3)) - column_number(m.group(1)) + 1
+                shapes.append((rows, cols))
+            else:
+                # Missing or single-cell dimension, guess from the uncompressed XML size
+                shapes.append((info.file_size // XLSX_XML_BYTES_PER_CELL, 1))
+    return shapes
+
+
+def cost_floor(file_size: int) -> JobCost:
+    # Lowest cost a file of this size can be estimated at, usable before its content is seen
+    return JobCost(
+        file_size=file_size,
+        n_sheets=1,
+        n_cells=0,
+        memory_mb=BASE_JOB_MB + file_size * 4 / (1024 * 1024),
+        seconds=SECONDS_PER_SHEET,
+    )
+
+
+def estimate_cost(filepath: str) -> JobCost:
+    file_size = os.path.getsize(filepath)
+    try:
+        shapes = probe_shape(filepath)
+    except Exception as e:
+        print(f"[WARNING] Shape probe failed for {filepath}: {e}")
+        shapes = [(file_size // BYTES_PER_CELL, 1)]
+
+    n_sheets = max(len(shapes), 1)
+    n_cells = sum(rows * cols for rows, cols in shapes)
+    memory_mb = BASE_JOB_MB + max(n_cells * BYTES_PER_CELL, file_size * 4) / (1024 * 1024)
+    seconds = n_sheets * SECONDS_PER_SHEET + n_cells / 1e6 * SECONDS_PER_MILLION_CELLS
+    return JobCost(
+        file_size=file_size,
+        n_sheets=n_sheets,
+        n_cells=n_cells,
+        memory_mb=memory_mb,
+        seconds=seconds,
+    )
+
+
+class JobScheduler:
+    def __init__(self, cpu_slots: int = CPU_SLOTS, memory_mb: float = MEMORY_BUDGET_MB,
+                 max_queued: int = MAX_QUEUED_JOBS):
+        self.cpu_slots = cpu_slots
+        self.memory_mb = memory_mb
+        self.max_queued = max_queued
+        self.running: Dict[int, Job] = {}
+        self.waiting: Dict[int, Job] = {}
+        self._seq = itertools.count()
+        self._cond: Optional[asyncio.Condition] = None
+        self._probe_sem: Optional[asyncio.Semaphore] = None
+
+    @property
+    def cond(self) -> asyncio.Condition:
+        # Created lazily so it binds to the server's event loop
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    @property
+    def probe_sem(self) -> asyncio.Semaphore:
+        if self._probe_sem is None:
+            self._probe_sem = asyncio.Semaphore(PROBE_SLOTS)
+        return self._probe_sem
+
+    async def estimate(self, filepath: str) -> JobCost:
+        async with self.probe_sem:
+            return await asyncio.to_thread(estimate_cost, filepath)
+
+    def check_saturated(self, file_size: int) -> None:
+        # Early reject before an upload body is stored. Uses the cost floor, so it only
+        # rejects jobs that admit() would reject too, and small files can still jump the queue
+        floor = cost_floor(file_size)
+        if not self._fits(floor) and len(self.waiting) >= self.max_queued:
+            raise SchedulerSaturated(self.retry_after(floor))
+
+    def _fits(self, cost: JobCost) -> bool:
+        if not self.running:
+            # A job bigger than the whole budget still runs, but only on its own
+            return True
+        used_cpu = sum(j.cost.cpu for j in self.running.values())
+        used_mem = sum(j.cost.memory_mb for j in self.running.values())
+        return (
+            used_cpu + cost.cpu <= self.cpu_slots
+            and used_mem + cost.memory_mb <= self.memory_mb
+        )
+
+    def _next_job(self) -> Optional[Job]:
+        now = time.monotonic()
+        ordered = sorted(self.waiting.values(), key=lambda j: (j.priority(now), j.seq))
+        return ordered[0] if ordered else None
+
+    def retry_after(self, cost: Optional[JobCost] = None) -> int:
+        # Time until the running job closest to finishing frees its budget, plus the queued
+        # work that would still be ahead of this job, spread across the CPU slots
+        now = time.monotonic()
+        remaining = [max(j.cost.seconds - (now - j.started), 0) for j in self.running.values() if j.started]
+        first_free = min(remaining) if remaining else 0
+        ahead = [
+            j for j in self.waiting.values()
+            if cost is None or j.priority(now) <= cost.seconds
+        ]
+        queued = sum(j.cost.seconds for j in ahead) / max(self.cpu_slots, 1)
+        return max(1, math.ceil(first_free + queued))
+
+    @asynccontextmanager
+    async def admit(self, cost: JobCost):
+        async with self.cond:
+            if not self._fits(cost) and len(self.waiting) >= self.max_queued:
+                raise SchedulerSaturated(self.retry_after(cost))
+
+            job = Job(cost=cost, seq=next(self._seq))
+            self.waiting[job.seq] = job
+            try:
+                await self.cond.wait_for(lambda: self._next_job() is job and self._fits(cost))
+            finally:
+                del self.waiting[job.seq]
+                # The head of the queue changed, whether this job starts or was cancelled
+                self.cond.notify_all()
+            job.started = time.monotonic()
+            self.running[job.seq] = job
+
+        try:
+            yield job
+        finally:
+            async with self.cond:
+                del self.running[job.seq]
+                self.cond.notify_all()
+
+
+scheduler = JobScheduler()
@@ -0,0 +1,131 @@
+"""
+Measures the small-sheet batching mode against a local LLM stand-in.
+
+The stand-in replaces the Azure OpenAI client with a fixed per-call latency and
+returns schema-valid structured responses, so the numbers reflect profiling,
+request and PDF overhead rather than model speed.
+
+Three runs are timed per phase (profile, LLM, PDF):
+- per-sheet: batching off, ydata profile per sheet
+- batched: batching on, still ydata per sheet, so the gain is batching alone
+- batched + light profile: batching on with the pandas-only small-sheet profile,
+  so the extra profiling gain comes from the profiler swap, not from batching
+
+Run from the repo root:
+    python -m benchmarks.batching_benchmark --sheets 40 --latency 1.5
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+from app import batching
+from app import CombinedInsightAgent
+from app import PDFAgent
+from app import llm_client
+from app.DataProfileAgent import get_data_profile
+
+
+class StandInLLM:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, response_format, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        analysis = {
+            "insights": [{"insight": "Stand-in insight", "takeaway": "Stand-in takeaway"}],
+            "charts": [{"plot": "fig = plt.figure()\nplt.plot([1, 2, 3])", "description": "Stand-in chart"}],
+        }
+        if response_format["json_schema"]["name"] == "batch_analysis":
+            names = re.findall(r"^Sheet:(.*)$", messages[-1]["content"], re.MULTILINE)
+            content = {"sheets": [dict(analysis, sheet_name=name) for name in names]}
+        else:
+            content = analysis
+        message = SimpleNamespace(content=json.dumps(content), refusal=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")])
+
+
+def make_workbook(path: str, n_sheets: int, n_rows: int) -> None:
+    rng = np.random.default_rng(0)
+    with pd.ExcelWriter(path) as writer:
+        for i in range(n_sheets):
+            df = pd.DataFrame({
+                "code": [f"C{j}" for j in range(n_rows)],
+                "category": rng.choice(["a", "b", "c"], n_rows),
+                "value": rng.normal(100, 15, n_rows).round(2),
+            })
+            df.to_excel(writer, sheet_name=f"lookup_{i}", index=False)
+
+
+def run(filepath: str, batched: bool, light_profile: bool, latency: float) -> dict:
+    batching.BATCH_SMALL_SHEETS = batched
+    batching.LIGHT_PROFILE_SMALL_SHEETS = light_profile
+    llm = StandInLLM(latency)
+    llm_client.client = llm
+
+    start = time.perf_counter()
+    state = get_data_profile({"filepath": filepath, "run_id": "bench"})
+    profiled = time.perf_counter()
+    state = CombinedInsightAgent.generate_insights_and_plots(state)
+    analysed = time.perf_counter()
+    state = PDFAgent.make_pdf_report(state)
+    done = time.perf_counter()
+
+    return {
+        "sheets": len(state["sheets"]),
+        "llm_calls": llm.calls,
+        "pdfs": len({sheet["pdf_path"] for sheet in state["sheets"]}),
+        "profile_s": profiled - start,
+        "llm_s": analysed - profiled,
+        "pdf_s": done - analysed,
+        "total_s": done - start,
+    }
+
+
+def gain(before: dict, after: dict, key: str) -> str:
+    return f"{before[key] / after[key]:.1f}x" if after[key] > 0 else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sheets", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=1.5, help="seconds per stand-in LLM call")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "workbook.xlsx")
+        make_workbook(path, args.sheets, args.rows)
+        # Keep benchmark PDFs out of the served reports folder
+        PDFAgent.REPORT_DIR = tmp
+
+        results = {
+            "per-sheet": run(path, batched=False, light_profile=False, latency=args.latency),
+            "batched": run(path, batched=True, light_profile=False, latency=args.latency),
+            "batched + light profile": run(path, batched=True, light_profile=True, latency=args.latency),
+        }
+
+    for mode, r in results.items():
+        print(
+            f"{mode:>24}: {r['sheets']} sheets, {r['llm_calls']} LLM calls, {r['pdfs']} PDFs | "
+            f"profile {r['profile_s']:.2f}s, LLM {r['llm_s']:.2f}s, PDF {r['pdf_s']:.2f}s, "
+            f"total {r['total_s']:.2f}s, {r['sheets'] / r['total_s']:.2f} sheets/s"
+        )
+
+    per_sheet, batched, light = results.values()
+    print(f"Batching gain, LLM phase: {gain(per_sheet, batched, 'llm_s')}")
+    print(f"Batching gain, PDF phase: {gain(per_sheet, batched, 'pdf_s')}")
+    print(f"Batching gain, end to end: {gain(per_sheet, batched, 'total_s')}")
+    print(f"Light profile gain, profile phase: {gain(batched, light, 'profile_s')}")
+    print(f"Batching + light profile gain, end to end: {gain(per_sheet, light, 'total_s')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import asyncio
+import pandas as pd
+import pytest
+from app import scheduler as sched
+from app.scheduler import JobCost, JobScheduler, SchedulerSaturated, probe_shape, estimate_cost
+
+
+def cost(seconds, memory_mb=100.0):
+    return JobCost(file_size=0, n_sheets=1, n_cells=0, memory_mb=memory_mb, seconds=seconds)
+
+
+async def hold(scheduler, job_cost, name, started, release):
+    async with scheduler.admit(job_cost):
+        started.append(name)
+        await release.wait()
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_shortest_job_first():
+    async def scenario():
+        s = JobScheduler(cpu_slots=1, memory_mb=1000, max_queued=4)
+        started, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(hold(s, cost(50), "blocker", started, release))]
+        await settle()
+        tasks.append(asyncio.create_task(hold(s, cost(100), "big", started, release)))
+        tasks.append(asyncio.create_task(hold(s, cost(1), "small", started, release)))
+        await settle()
+        assert started == ["blocker"]
+        release.set()
+        await asyncio.gather(*tasks)
+        return started
+
+    assert asyncio.run(scenario()) == ["blocker", "small", "big"]
+
+
+def test_aging_lets_long_waiting_job_go_first(monkeypatch):
+    monkeypatch.setattr(sched, "AGING_RATE", 1000.0)
+
+    async def scenario():
+        s = JobScheduler(cpu_slots=1, memory_mb=1000, max_queued=4)
+        started, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(hold(s, cost(50), "blocker", started, release))]
+        await settle()
+        tasks.append(asyncio.create_task(hold(s, cost(100), "big", started, release)))
+        # 0.2s of waiting at 1000x outweighs the 99s size difference
+        await asyncio.sleep(0.2)
+        tasks.append(asyncio.create_task(hold(s, cost(1), "small", started, release)))
+        await settle()
+        release.set()
+        await asyncio.gather(*tasks)
+        return started
+
+    assert asyncio.run(scenario()) == ["blocker", "big", "small"]
+
+
+def test_full_queue_rejects_only_jobs_that_do_not_fit():
+    async def scenario():
+        s = JobScheduler(cpu_slots=4, memory_mb=1000, max_queued=1)
+        started, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(hold(s, cost(50, 800), "blocker", started, release))]
+        await settle()
+        # Memory-blocked job fills the queue
+        tasks.append(asyncio.create_task(hold(s, cost(100, 500), "big", started, release)))
+        await settle()
+
+        with pytest.raises(SchedulerSaturated):
+            async with s.admit(cost(10, 500)):
+                pass
+        with pytest.raises(SchedulerSaturated):
+            s.check_saturated(2 * 1024 ** 3)
+        s.check_saturated(5 * 1024)
+
+        # A small job still fits next to the blocker and jumps the queue
+        tasks.append(asyncio.create_task(hold(s, cost(1, 50), "small", started, release)))
+        await settle()
+        assert started == ["blocker", "small"]
+        release.set()
+        await asyncio.gather(*tasks)
+        return started
+
+    assert asyncio.run(scenario()) == ["blocker", "small", "big"]
+
+
+def test_cancelled_waiter_is_removed_and_unblocks_queue():
+    async def scenario():
+        s = JobScheduler(cpu_slots=1, memory_mb=1000, max_queued=4)
+        started, release = [], asyncio.Event()
+        blocker = asyncio.create_task(hold(s, cost(50), "blocker", started, release))
+        await settle()
+        head = asyncio.create_task(hold(s, cost(1), "head", started, release))
+        behind = asyncio.create_task(hold(s, cost(100), "behind", started, release))
+        await settle()
+        assert len(s.waiting) == 2
+
+        head.cancel()
+        await settle()
+        assert len(s.waiting) == 1
+
+        release.set()
+        await asyncio.gather(blocker, behind)
+        assert not s.running and not s.waiting
+        return started
+
+    assert asyncio.run(scenario()) == ["blocker", "behind"]
+
+
+def test_retry_after_counts_only_queued_work_ahead():
+    async def scenario():
+        s = JobScheduler(cpu_slots=2, memory_mb=1000, max_queued=4)
+        started, release = [], asyncio.Event()
+        tasks = [
+            asyncio.create_task(hold(s, cost(100), "a", started, release)),
+            asyncio.create_task(hold(s, cost(40), "b", started, release)),
+        ]
+        await settle()
+        tasks.append(asyncio.create_task(hold(s, cost(10), "short", started, release)))
+        tasks.append(asyncio.create_task(hold(s, cost(300), "long", started, release)))
+        await settle()
+
+        # First slot frees after ~40s, then (10 + 300) / 2 slots of queued work
+        everything = s.retry_after()
+        # A 20s job would only wait behind the 10s job
+        short = s.retry_after(cost(20))
+        release.set()
+        await asyncio.gather(*tasks)
+        return everything, short
+
+    everything, short = asyncio.run(scenario())
+    assert everything == 195
+    assert short == 45
+
+
+def test_retry_after_is_at_least_one_second():
+    assert JobScheduler().retry_after() == 1
+
+
+def test_probe_shape_csv(tmp_path):
+    path = tmp_path / "data.csv"
+    pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]}).to_csv(path, index=False)
+    assert probe_shape(str(path)) == [(4, 2)]
+
+
+def test_probe_shape_xlsx_reads_dimensions(tmp_path):
+    path = tmp_path / "book.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({"a": range(10), "b": range(10), "c": range(10)}).to_excel(writer, sheet_name="one", index=False)
+        pd.DataFrame({"a": range(4)}).to_excel(writer, sheet_name="two", index=False)
+    assert sorted(probe_shape(str(path))) == [(5, 1), (11, 3)]
+
+
+def test_estimate_cost_survives_unreadable_file(tmp_path):
+    path = tmp_path / "broken.xlsx"
+    path.write_bytes(b"not a zip" * 100)
+    result = estimate_cost(str(path))
+    assert result.n_sheets == 1
+    assert result.memory_mb > sched.BASE_JOB_MB